@@ -11,3 +11,13 @@ for fn in *.cpp; do
        echo "### Fail: out/$fn.syntax differs from ref"
     fi
 done
+
+for fn in *.yaml; do
+    ../vim-cpptags.py --clangd-index $fn -C -o out/$fn.tags -s out/$fn.syntax
+    if ! diff ref/$fn.tags out/$fn.tags; then
+       echo "out/$fn.tags differs from ref"
+    fi
+    if ! diff ref/$fn.syntax out/$fn.syntax; then
+       echo "### Fail: out/$fn.syntax differs from ref"
+    fi
+done
@@ -24,15 +24,20 @@
 # SOFTWARE.
 
 import argparse
+import concurrent.futures
+import heapq
 import os
 import re
 import subprocess
 import sys
 
+from clang.cindex import callbacks
+from clang.cindex import conf
 from clang.cindex import Config
 from clang.cindex import CursorKind
 from clang.cindex import Diagnostic
 from clang.cindex import Index
+from clang.cindex import TranslationUnit
 from clang.cindex import TranslationUnitLoadError
 
 def printErrorsAndExit(errors):
@@ -58,8 +63,11 @@ class Settings(object):
     defines = []
     userIncludes = []
     systemIncludes = []
+    systemIncludesTuple = ()
     shouldCollectSystemIncludes = True
     shouldUseCtags = True
+    shouldSkipFunctionBodies = False
+    clangdIndexFile = ""
     inputTagfile = ""
     inputFilenames = []
     outputTagfile = ""
@@ -133,6 +141,18 @@ class Settings(object):
             default=not Settings.shouldUseCtags,
             help="Don't use ctags to collect macro definitions."
         )
+        parser.add_argument(
+            "-b", "--skip-function-bodies",
+            action="store_true",
+            default=Settings.shouldSkipFunctionBodies,
+            help="Don't parse function bodies. This speeds up parsing considerably, but tags for function-local variables are not collected."
+        )
+        parser.add_argument(
+            "--clangd-index",
+            metavar="<filename>",
+            default=Settings.clangdIndexFile,
+            help="YAML symbol index produced by clangd-indexer. When this option is specified the input files are not parsed with clang; the tags are read from the index instead, which amortises the parsing cost across tagfile re-generations."
+        )
         parser.add_argument(
             "-t", "--tagfile",
             metavar="<filename>",
@@ -142,7 +162,7 @@ class Settings(object):
         parser.add_argument(
             "filenames",
             metavar="<input file>",
-            nargs="+",
+            nargs="*",
             default=[],
             help="Input C++ source file."
         )
@@ -162,40 +182,119 @@ class Settings(object):
         )
         args = parser.parse_args(argv[1:])
 
+        if len(args.filenames) == 0 and args.clangd_index == "":
+            parser.error("the following arguments are required: <input file>")
+
         Settings.libclangSo = args.libclang
         Settings.shouldSort = not args.no_sort
         Settings.cxxFlags = args.cxx_flags
         Settings.defines = args.defines
         Settings.userIncludes = args.user_includes
         Settings.systemIncludes = args.system_includes
+        Settings.systemIncludesTuple = tuple(args.system_includes)
         Settings.shouldCollectSystemIncludes = not args.no_collect_system_includes
         Settings.shouldUseCtags = not args.no_use_ctags
+        Settings.shouldSkipFunctionBodies = args.skip_function_bodies
+        Settings.clangdIndexFile = args.clangd_index
         Settings.inputTagfile = args.tagfile
         Settings.inputFilenames = args.filenames
         Settings.outputTagfile = args.output_tagfile
         Settings.outputSyntaxfile = args.output_syntaxfile
 
+    @staticmethod
+    def asDict():
+        """
+        Return the settings as a dictionary, suitable for
+        Settings.fromDict().
+
+        The dictionary is used for carrying the settings into the worker
+        processes of the process pool: parseArgv() runs only in the parent,
+        so workers that are spawned rather than forked would otherwise run
+        with the defaults.
+        """
+
+        return {
+            "libclangSo": Settings.libclangSo,
+            "shouldSort": Settings.shouldSort,
+            "cxxFlags": Settings.cxxFlags,
+            "defines": Settings.defines,
+            "userIncludes": Settings.userIncludes,
+            "systemIncludes": Settings.systemIncludes,
+            "systemIncludesTuple": Settings.systemIncludesTuple,
+            "shouldCollectSystemIncludes": Settings.shouldCollectSystemIncludes,
+            "shouldUseCtags": Settings.shouldUseCtags,
+            "shouldSkipFunctionBodies": Settings.shouldSkipFunctionBodies,
+            "clangdIndexFile": Settings.clangdIndexFile,
+            "inputTagfile": Settings.inputTagfile,
+            "inputFilenames": Settings.inputFilenames,
+            "outputTagfile": Settings.outputTagfile,
+            "outputSyntaxfile": Settings.outputSyntaxfile,
+            "currentFilename": Settings.currentFilename
+        }
+
+    @staticmethod
+    def fromDict(settings):
+        """
+        Initialise settings with values from the dictionary `settings', as
+        returned by Settings.asDict().
+        """
+
+        for (name, value) in settings.items():
+            setattr(Settings, name, value)
+
 class Collector(object):
     """
     Class for collecting and writing out the collected tags.
 
-    To avoid duplicates in the output tagfile the following strategy is
-    deployed:
-    - when tags are sorted (`Settings.shouldSort' == True), collect all tags
-      from the coming cursors and only when outputting the tags, make sure that
-      duplicates are avoided;
-    - when tags are *not* sorted (`Settings.shouldSort' == False), collect tags
-      only if they were not previously collected.
+    The tags are kept in one set per category (file tags, macro tags, tags
+    sourced from the input tagfile and cursor tags), so duplicates are
+    avoided on insertion and each category can be written out by its own
+    specialised loop in writeTags().
     """
 
     fieldsDefs = {}
     fields = {}
-    reTagEntry = re.compile(r'^([^\t]+)\t([^\t]+)\t([^\t]+);"\t(.*)$')
-    reDefine = re.compile(r'^(\w+).*$')
-    reFunctionTemplate = re.compile('^(.*)<[^>]*>$')
+    # The pattern is anchored at the start of the string, so it is applied
+    # with match(); re.ASCII keeps \w on the cheap ASCII tables.
+    reDefine = re.compile(r'^(\w+).*$', re.ASCII)
+    reFileUri = re.compile(r'^file://[^/]*(/.*)$')
+
+    # CXChildVisitResult values for the clang_visitChildren() callback.
+    visitContinue = 1
+    visitRecurse = 2
+
+    # Number of formatted tag lines that are written out in one call.
+    writeBatchSize = 4096
+
+    # Option names of the ':syntax keyword' command; they cannot be used as
+    # keywords themselves.
+    disallowedNames = frozenset({
+        "cchar",
+        "conceal",
+        "concealends",
+        "contained",
+        "containedin",
+        "contains",
+        "display",
+        "extend",
+        "fold",
+        "nextgroup",
+        "oneline",
+        "skipempty",
+        "skipnl",
+        "skipwhite",
+        "transparent"
+    })
 
     def __init__(self):
-        self.tags = set()
+        self.fileTags = set()
+        self.macroTags = set()
+        self.importedTags = set()
+        self.cursorTags = set()
+        self.tagFilenames = set()
+        self.basenameCache = {}
+        self.systemFileCache = {}
+        self.currentFileCache = {}
         self.types = set()
         self.constants = set()
         self.functions = set()
@@ -207,130 +306,179 @@ class Collector(object):
             [ "cppUserType", self.types ]
         ]
 
-    @staticmethod
-    def canCollectTag(child):
-        """
-        Determine whether the cursor `child' is collectable.
-
-        Return:
-        True -- `child' can be used for collecting a tag
-        False -- otherwise
-        """
-
-        return (
-            (child.kind in Collector.fields) and
-            (
-                next(
-                    (
-                        si for si in Settings.systemIncludes
-                            if child.location.file.name.startswith(si)
-                    ),
-                    None
-                ) is None
-                if not Settings.shouldCollectSystemIncludes else True
-            ) and
-            (
-                child.is_definition()
-                if child.kind in Collector.fieldsDefs else True
-            ) and
-            (
-                child.location.file.name.endswith(Settings.currentFilename)
-                if Settings.inputTagfile != "" else True
-            )
-        )
-
-    def collectTags(self, tu):
+    def mergeCollected(self, collector):
         """
-        Collect tags from the TranslationUnit `tu'.
-
-        Also, when `Settings.shouldUseCtags' == True, collect tags that are
-        macro definitions.
+        Merge the contents of `collector', as returned by parseOne(), into
+        this collector.
         """
 
-        self.collectCursorTags(tu.cursor.get_children())
-        if Settings.shouldUseCtags:
-            self.collectMacroTags()
+        self.fileTags.update(collector.fileTags)
+        self.cursorTags.update(collector.cursorTags)
+        self.tagFilenames.update(collector.tagFilenames)
+        self.types.update(collector.types)
+        self.constants.update(collector.constants)
+        self.functions.update(collector.functions)
+        self.identifiers.update(collector.identifiers)
 
-    def collectCursorTags(self, children):
-        """
-        Collect tags from each cursor in `children'.
+    def collectCursorTags(self, cursor):
         """
+        Collect tags from all descendants of the cursor `cursor'.
 
-        for c in children:
-            self.collectCursorTag(c)
+        Also, collect a tag for the file that is indicated by each collected
+        cursor.
 
-    def collectCursorTag(self, child):
-        """
-        Collect a tag from `child'.
+        The traversal is delegated to clang_visitChildren(), which walks the
+        whole AST in a single libclang call and invokes `visit' for every
+        cursor; get_children() would instead materialise a list of cursors
+        per AST level, with one libclang call and one Python iterator each.
 
-        Also, collect a tag for the file that is indicated by `child'.
-        """
+        When tags from system includes are not collected, a cursor that is
+        located under one of the system include directories is not descended
+        into at all -- the whole subtree (e.g. everything pulled in by
+        '#include <vector>') is rejected in one step instead of per cursor.
 
-        if Collector.canCollectTag(child):
-            name = Collector.fields[child.kind][1](self, child.spelling)
-            filename = child.location.file.name
+        The checks in `visit' are laid out cheapest first and each cursor
+        property is read exactly once into a local; every property access is
+        a ctypes call into libclang and every cursor of the AST comes through
+        here.
+        """
 
-            tag = (os.path.basename(filename), filename)
-            self.addTag(tag)
+        tu = cursor._tu
+        shouldPrune = (
+            not Settings.shouldCollectSystemIncludes and
+            len(Settings.systemIncludesTuple) > 0
+        )
 
-            tag = (
-                name,
-                filename,
-                child.location.line,
-                child.location.column,
-                child.kind
+        # Bind everything the callback needs to locals of this frame; the
+        # callback runs once per AST cursor and a closure variable load is
+        # cheaper than the attribute chains it replaces.
+        fields = Collector.fields
+        fieldsSet = Collector.fieldsSet
+        fieldsDefsSet = Collector.fieldsDefsSet
+        visitContinue = Collector.visitContinue
+        visitRecurse = Collector.visitRecurse
+        systemIncludes = Settings.systemIncludesTuple
+        checkCurrentFile = Settings.inputTagfile != ""
+        currentFilename = Settings.currentFilename
+        systemFileCache = self.systemFileCache
+        currentFileCache = self.currentFileCache
+        tagFilenames = self.tagFilenames
+        basenameCache = self.basenameCache
+        fileTags = self.fileTags
+        cursorTags = self.cursorTags
+        basenameOf = os.path.basename
+
+        def visit(child, parent, clientData):
+            child._tu = tu # keep the cursor usable, as get_children() does
+
+            kind = child.kind
+            isCollectable = kind in fieldsSet
+            if not (isCollectable or shouldPrune):
+                return visitRecurse
+
+            location = child.location
+            locationFile = location.file
+            if locationFile is None: # e.g. cursors from command-line defines
+                return visitRecurse
+
+            filename = locationFile.name
+            if shouldPrune:
+                # The cursors of a translation unit share a handful of
+                # filenames, so the prefix scan is memoized per filename.
+                isSystem = systemFileCache.get(filename)
+                if isSystem is None:
+                    isSystem = filename.startswith(systemIncludes)
+                    systemFileCache[filename] = isSystem
+                if isSystem:
+                    return visitContinue # skip the whole subtree
+
+            if not isCollectable:
+                return visitRecurse
+
+            if kind in fieldsDefsSet:
+                if not child.is_definition():
+                    return visitRecurse
+
+            if checkCurrentFile:
+                isCurrent = currentFileCache.get(filename)
+                if isCurrent is None:
+                    isCurrent = filename.endswith(currentFilename)
+                    currentFileCache[filename] = isCurrent
+                if not isCurrent:
+                    return visitRecurse
+
+            field = fields[kind] # resolved once per cursor
+            name = field[1](self, child.spelling)
+
+            if not filename in tagFilenames:
+                tagFilenames.add(filename)
+
+                basename = basenameCache.get(filename)
+                if basename is None:
+                    basename = basenameOf(filename)
+                    basenameCache[filename] = basename
+
+                fileTags.add((basename, filename))
+
+            cursorTags.add(
+                (name, filename, location.line, location.column, field[0])
             )
-            self.addTag(tag)
 
-        self.collectCursorTags(child.get_children())
+            return visitRecurse
+
+        conf.lib.clang_visitChildren(
+            cursor,
+            callbacks["cursor_visit"](visit),
+            None
+        )
 
     def collectMacroTags(self):
         """
         Use `ctags' to collect tags that are macro definitions.
+
+        The output of `ctags' is consumed line by line as it is produced,
+        rather than buffered whole in memory, so parsing overlaps with the
+        `ctags' run and the memory use stays bounded.
         """
 
-        filenames = []
-        for tag in self.tags:
-            if len(tag) == 2: # file tag
-                filename = tag[1]
-                if not filename in filenames:
-                    filenames.append(filename)
+        filenames = sorted(self.tagFilenames)
 
         if len(filenames) > 0:
             args = [
                 "ctags",
                 "--c++-kinds=d",
+                "--sort=no",
                 "-o",
                 "-",
             ]
             args.extend(filenames)
 
-            sp = subprocess.Popen(args, stdout=subprocess.PIPE)
-            (out, _) = sp.communicate()
-            out = out.decode("utf-8")
+            sp = subprocess.Popen(
+                args,
+                stdout=subprocess.PIPE,
+                bufsize=1 << 16,
+                universal_newlines=True
+            )
 
-            for ln in out.split("\n"):
-                mo = Collector.reTagEntry.search(ln)
-                if not mo is None:
-                    tag = mo.group(1, 2, 3)
-                    self.addTag(tag)
+            for ln in sp.stdout:
+                # Tag entries are tab delimited with the ex command terminated
+                # by ';"'; str.split is considerably cheaper than a regex here.
+                parts = ln.rstrip("\n").split("\t", 3)
+                if len(parts) == 4 and parts[2].endswith(';"'):
+                    tag = (parts[0], parts[1], parts[2][:-2])
+                    self.macroTags.add(tag)
                     self.addConstant(tag[0])
 
+            sp.wait()
+
             for d in Settings.defines:
-                mo = Collector.reDefine.search(d)
+                mo = Collector.reDefine.match(d)
                 if not mo is None:
                     name = mo.group(1)
                     tag = ( name, "<command-line>", "0" )
-                    self.addTag(tag)
+                    self.macroTags.add(tag)
                     self.addConstant(tag[0])
 
-    def addTag(self, tag):
-        """
-        Add `tag' to `self.tags'.
-        """
-
-        self.tags.add(tag)
-
     def addType(self, name):
         """
         Add `name' to `self.types'.
@@ -357,7 +505,8 @@ class Collector(object):
         """
 
         if not name.startswith("operator"):
-            name = Collector.reFunctionTemplate.sub(r"\1", name)
+            if "<" in name and name.endswith(">"):
+                name = name.partition("<")[0]
             self.functions.add(name)
         return name
 
@@ -373,52 +522,47 @@ class Collector(object):
         """
         Write out the collected tags on the provided `writer'.
 
-        Also, make sure that there are no duplicate tags in the output when the
-        tags are sorted. (Note: when the tags are *not* sorted, there should be
-        no duplicates already).
+        Each tag category is formatted by its own specialised loop with a
+        fixed format, so no per-tag arity dispatch or field lookup is needed.
+        When the output is sorted, the per-category streams are sorted
+        individually and then k-way merged; with the same str() sort key as
+        before, that yields the exact ordering of one global sort.
         """
 
+        tagGroups = [
+            # (tags, format); the tag tuples of each category match
+            # the %-template they are paired with
+            (self.fileTags, '%s\t%s\t1;"\tkind:F'),
+            (self.macroTags, '%s\t%s\t%s;"\tkind:d'),
+            (self.importedTags, '%s\t%s\t%s;"\t%s'),
+            (self.cursorTags, '%s\t%s\t:call cursor(%d,%d)|;"\t%s')
+        ]
+
         if Settings.shouldSort:
-            self.tags = sorted(self.tags, key=lambda tag: str(tag))
+            lines = (
+                line for (_, line) in heapq.merge(*[
+                    sorted(
+                        (str(tag), fmt % tag)
+                        for tag in tags if len(tag[0]) > 0
+                    )
+                    for (tags, fmt) in tagGroups
+                ])
+            )
+        else:
+            lines = (
+                fmt % tag
+                for (tags, fmt) in tagGroups
+                    for tag in tags if len(tag[0]) > 0
+            )
 
-        for tag in self.tags:
-            if len(tag[0]) == 0:
-                continue
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= Collector.writeBatchSize:
+                writer.writeLines(batch)
+                batch = []
 
-            if len(tag) == 2: # file tag
-                writer.writeLine(
-                    '%s\t%s\t1;"\tkind:F' % (
-                        tag[0], # basename
-                        tag[1] # filename
-                    )
-                )
-            elif len(tag) == 3: # macro definition tag
-                writer.writeLine(
-                    '%s\t%s\t%s;"\tkind:d' % (
-                        tag[0], # macro name
-                        tag[1], # filename
-                        tag[2] # ex command (e.g. line number)
-                    )
-                )
-            elif len(tag) == 4: # tag sourced from input tagfile
-                writer.writeLine(
-                    '%s\t%s\t%s;"\t%s' % (
-                        tag[0], # tagname
-                        tag[1], # filename
-                        tag[2], # ex command
-                        tag[3] # fields
-                    )
-                )
-            else: # cursor kind tags
-                writer.writeLine(
-                    '%s\t%s\t:call cursor(%d,%d)|;"\t%s' % (
-                        tag[0], # tagname
-                        tag[1], # filename
-                        tag[2], # line number
-                        tag[3], # column number
-                        Collector.fields[tag[4]][0] # cursor kind
-                    )
-                )
+        writer.writeLines(batch)
 
     def writeSyntaxGroups(self, writer):
         """
@@ -432,30 +576,131 @@ class Collector(object):
     def writeSyntaxGroup(self, writer, group):
         """
         Write out `group' on the provided `writer'.
+
+        The keywords are written in sorted order so that the output does not
+        depend on the iteration order of the underlying set.
         """
 
         writer.write("syntax keyword " + group[0])
-        for kw in group[1]:
+        for kw in sorted(group[1]):
             writer.write(" " + kw)
         writer.write("\n")
 
     def readTagfile(self, fn):
         """
-        Read input tagfile `fn' and populate `self.tags' with copies from that
-        file.
+        Read input tagfile `fn' and populate `self.importedTags' with copies
+        from that file.
 
         Only tags whose filename is *not* present in `Settings.inputFilenames'
         are used to populate tags. This is to make it possible to update the
         tags whose filename *is* present in `Settings.inputFilenames'.
         """
 
+        inputFilenames = set(Settings.inputFilenames)
+
         with open(fn) as fo:
             for ln in fo:
-                mo = Collector.reTagEntry.search(ln)
-                if not mo is None:
-                    tag = mo.group(1, 2, 3, 4)
-                    if not tag[1] in Settings.inputFilenames:
-                        self.addTag(tag)
+                # Tag entries are tab delimited with the ex command terminated
+                # by ';"'; str.split is considerably cheaper than a regex here.
+                parts = ln.rstrip("\n").split("\t", 3)
+                if len(parts) == 4 and parts[2].endswith(';"'):
+                    if not parts[1] in inputFilenames:
+                        self.importedTags.add(
+                            (parts[0], parts[1], parts[2][:-2], parts[3])
+                        )
+
+    def readClangdIndex(self, fn):
+        """
+        Read the YAML symbol dump `fn', as produced by clangd-indexer, and
+        populate the tag containers from its Symbol entries.
+
+        Only the keys that are needed for building tags are extracted (Name,
+        SymInfo/Kind and the Definition/CanonicalDeclaration locations), so
+        no YAML library is required. The index locations are zero based;
+        collectClangdSymbolTag() converts them to the one based lines and
+        columns that tagfiles use.
+        """
+
+        name = None
+        kind = None
+        locations = {}
+        section = None
+        subsection = None
+
+        with open(fn) as fo:
+            for ln in fo:
+                if ln.startswith("---") or ln.startswith("..."):
+                    self.collectClangdSymbolTag(name, kind, locations)
+                    name = None
+                    kind = None
+                    locations = {}
+                    section = None
+                    subsection = None
+                    continue
+
+                (key, sep, value) = ln.strip().partition(":")
+                if sep == "":
+                    continue
+                value = value.strip().strip("'\"")
+
+                if not ln[0].isspace(): # top-level key of the Symbol entry
+                    section = key
+                    subsection = None
+                    if key == "Name":
+                        name = value
+                elif section == "SymInfo":
+                    if key == "Kind":
+                        kind = value
+                elif section in ("Definition", "CanonicalDeclaration"):
+                    if key == "FileURI":
+                        locations.setdefault(section, {})[key] = value
+                    elif key in ("Start", "End"):
+                        subsection = key
+                    elif subsection == "Start" and key in ("Line", "Column"):
+                        locations.setdefault(section, {})[key] = value
+
+            self.collectClangdSymbolTag(name, kind, locations)
+
+    def collectClangdSymbolTag(self, name, kind, locations):
+        """
+        Collect a tag from the values extracted from one clangd Symbol entry.
+
+        The definition location is preferred; a symbol without a definition
+        falls back to its canonical declaration. Symbols whose kind has no
+        counterpart in `Collector.clangdKinds' are skipped.
+        """
+
+        if name is None or len(name) == 0:
+            return
+
+        field = Collector.clangdKinds.get(kind)
+        if field is None:
+            return
+
+        location = locations.get("Definition")
+        if location is None:
+            location = locations.get("CanonicalDeclaration")
+        if location is None:
+            return
+
+        mo = Collector.reFileUri.match(location.get("FileURI", ""))
+        if mo is None:
+            return
+        filename = mo.group(1)
+
+        try:
+            line = int(location["Line"]) + 1
+            column = int(location["Column"]) + 1
+        except (KeyError, ValueError):
+            return
+
+        tagName = field[1](self, name)
+
+        if not filename in self.tagFilenames:
+            self.tagFilenames.add(filename)
+            self.fileTags.add((os.path.basename(filename), filename))
+
+        self.cursorTags.add((tagName, filename, line, column, field[0]))
 
     def writeTagfile(self, fn, progname):
         """
@@ -483,34 +728,18 @@ class Collector(object):
         Write output syntax file to file designated by `fn'.
         """
 
-        disallowedNames = {
-            "cchar",
-            "conceal",
-            "concealends",
-            "contained",
-            "containedin",
-            "contains",
-            "display",
-            "extend",
-            "fold",
-            "nextgroup",
-            "oneline",
-            "skipempty",
-            "skipnl",
-            "skipwhite",
-            "transparent"
-        }
-
         if fn == "-":
             writer = WriterStdout()
         else:
             writer = WriterFile(fn)
 
-        n = len(self.syntaxGroups)
-        for i in range(n):
-            self.syntaxGroups[i][1] -= disallowedNames
-            for j in range(i + 1, n):
-                self.syntaxGroups[i][1] -= self.syntaxGroups[j][1]
+        # Walk the groups from the highest priority down: each name stays in
+        # the highest-priority group that owns it and is removed from all the
+        # lower ones with a single subtraction per group.
+        seen = set(Collector.disallowedNames)
+        for sg in reversed(self.syntaxGroups):
+            sg[1] -= seen
+            seen |= sg[1]
 
         self.writeSyntaxGroups(writer)
 
@@ -536,6 +765,30 @@ class Collector(object):
         CursorKind.FUNCTION_TEMPLATE: ( "cursor:function-template", addFunction ),
     }
     fields.update(fieldsDefs)
+    fieldsSet = frozenset(fields)
+    fieldsDefsSet = frozenset(fieldsDefs)
+
+    # clangd symbol kinds mapped onto the cursor kind labels used above.
+    clangdKinds = {
+        "Class": ( "cursor:class", addType ),
+        "Struct": ( "cursor:struct", addType ),
+        "Union": ( "cursor:union", addType ),
+        "Enum": ( "cursor:enum", addType ),
+        "EnumConstant": ( "cursor:enum-constant", addConstant ),
+        "Typedef": ( "cursor:typedef", addType ),
+        "TypeAlias": ( "cursor:type-alias", addType ),
+        "Namespace": ( "cursor:namespace", addType ),
+        "Function": ( "cursor:function", addFunction ),
+        "Constructor": ( "cursor:ctor", addFunction ),
+        "Destructor": ( "cursor:dtor", addFunction ),
+        "InstanceMethod": ( "cursor:method", addFunction ),
+        "ClassMethod": ( "cursor:method", addFunction ),
+        "StaticMethod": ( "cursor:method", addFunction ),
+        "ConversionFunction": ( "cursor:method", addFunction ),
+        "Field": ( "cursor:field", addIdentifier ),
+        "Variable": ( "cursor:var", addIdentifier ),
+        "Parameter": ( "cursor:param", addIdentifier ),
+    }
 
 class Writer(object):
     """
@@ -554,19 +807,18 @@ class Writer(object):
 
     def writeLine(self, line):
         """
-        Write out `line', followed by LF.
+        Write out `line', followed by LF, as a single write.
         """
 
-        self.write(line)
-        self.fileObject.write("\n")
+        self.write(line + "\n")
 
     def writeLines(self, lines):
         """
-        Write out `lines'.
+        Write out `lines', each followed by LF, as a single write.
         """
 
-        for ln in lines:
-            self.writeLine(ln)
+        if len(lines) > 0:
+            self.write("\n".join(lines) + "\n")
 
 class WriterStdout(Writer):
     """
@@ -587,16 +839,86 @@ class WriterFile(Writer):
         value.
         """
 
-        fo = open(fn, "w")
+        fo = open(fn, "w", buffering=1 << 20)
         super(WriterFile, self).__init__(fo)
 
+def initWorker(settings):
+    """
+    Initialise a worker process of the process pool.
+
+    Apply the parent's settings and configure the clang library. Both are
+    per-process state: a worker that is spawned rather than forked re-imports
+    the module and would otherwise run with the default settings and an
+    unconfigured clang.
+    """
+
+    Settings.fromDict(settings)
+    Config.set_library_file(Settings.libclangSo)
+
+workerIndex = None
+
+def parseOne(filename, args):
+    """
+    Parse `filename' with the compilation arguments `args' and collect tags
+    from it.
+
+    The function is run in a worker process of the process pool that is
+    created in main(). The collected tags are plain tuples (CursorKind
+    objects are resolved to their 'cursor:*' labels at collection time), so
+    nothing clang-specific crosses the process boundary.
+
+    Return:
+    (collector, errors) -- `collector' is the Collector with the collected
+        tags and syntax group names, suitable for
+        Collector.mergeCollected(), or None when clang failed to parse
+        `filename'; in that case `errors' carries the error messages.
+    """
+
+    sys.stderr.write(">>> Parsing: %s...\n" % (filename))
+
+    global workerIndex
+    if workerIndex is None:
+        workerIndex = Index.create()
+
+    Settings.currentFilename = filename
+    errors = []
+    try:
+        options = TranslationUnit.PARSE_PRECOMPILED_PREAMBLE
+        if Settings.shouldSkipFunctionBodies:
+            options |= TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+
+        tu = workerIndex.parse(
+            filename,
+            args=args,
+            options=options
+        )
+        # Check the severity before touching anything else on the diagnostic;
+        # on a clean parse this loop then costs one attribute read per entry.
+        errorSeverities = (Diagnostic.Error, Diagnostic.Fatal)
+        for d in tu.diagnostics:
+            if d.severity in errorSeverities:
+                errors.append(repr(d))
+        haveErrors = len(errors) > 0
+    except TranslationUnitLoadError as ex:
+        errors.append(str(ex))
+        haveErrors = True
+
+    if haveErrors:
+        errors.insert(0, "Error: clang failed to parse '%s'" % filename)
+        return (None, errors)
+
+    collector = Collector()
+    collector.collectCursorTags(tu.cursor)
+
+    return (collector, [])
+
 def main(argv):
     """
     Main entry point of the script.
 
-    Configure clang library, parse the input arguments, parse the input files,
-    collect tags and write out tags and syntax groups to the specified output
-    (file or stdout).
+    Parse the input arguments, parse the input files in a pool of worker
+    processes (one translation unit per task), collect tags and write out tags
+    and syntax groups to the specified output (file or stdout).
 
     The function exits with error code == 1 when error occurs.
 
@@ -609,7 +931,6 @@ def main(argv):
 
     Settings.parseArgv(argv)
 
-    Config.set_library_file(Settings.libclangSo)
     collector = Collector()
 
     if Settings.inputTagfile != "":
@@ -621,34 +942,26 @@ def main(argv):
     args.extend(["-I" + i for i in Settings.systemIncludes])
     args.extend(["-D" + d for d in Settings.defines])
 
-    for filename in Settings.inputFilenames:
-        sys.stderr.write(">>> Parsing: %s...\n" % (filename))
-
-        Settings.currentFilename = filename
-        index = Index.create()
-        errors = []
-        try:
-            tu = index.parse(
-                filename,
-                args=args
-            )
-            errors = [
-                repr(d) for d in tu.diagnostics
-                    if d.severity in (
-                        Diagnostic.Error,
-                        Diagnostic.Fatal
-                    )
+    if Settings.clangdIndexFile != "":
+        collector.readClangdIndex(Settings.clangdIndexFile)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            initializer=initWorker,
+            initargs=(Settings.asDict(),)
+        ) as executor:
+            futures = [
+                executor.submit(parseOne, filename, args)
+                for filename in Settings.inputFilenames
             ]
-            haveErrors = len(errors) > 0
-        except TranslationUnitLoadError as ex:
-            errors.append(ex.message)
-            haveErrors = True
-
-        if haveErrors:
-            errors.insert(0, "Error: clang failed to parse '%s'" % filename)
-            printErrorsAndExit(errors)
-
-        collector.collectTags(tu)
+            for future in futures:
+                (collected, errors) = future.result()
+                if collected is None:
+                    printErrorsAndExit(errors)
+                collector.mergeCollected(collected)
+
+    if Settings.shouldUseCtags:
+        collector.collectMacroTags()
 
     if not Settings.outputTagfile is None:
         collector.writeTagfile(Settings.outputTagfile, os.path.basename(argv[0]))